@@ -0,0 +1,15 @@
+# ============================
+# Gunicorn 設定 (起動ディレクトリの gunicorn.conf.py は自動で読み込まれる)
+#   例: gunicorn slack_spreadsheet:flask_app
+# ============================
+
+# Slack イベントの処理は OpenAI / Sheets / Slack API 待ちがほとんど (I/O待ちでGILを解放する) ため、
+# 同期ワーカー1本ずつではなくスレッドワーカーで同時に複数のリクエストを受ける
+# 重複イベントの判定・署名の記録・GPTキャッシュ (メモリ版)・ワークシート一覧・書き込みスレッドは
+# すべてプロセス内にあるため、ワーカープロセスは1つにする。
+# 2つ以上にすると、Slackの再送が別プロセスに届いたときに重複行が書かれたり、
+# 同じ新規チャンネルのシートを2プロセスが同時に作ろうとしたりする。
+# 重い処理はリクエストスレッドの外 (スレッドプール) で行うので、1プロセスでも同時処理数は足りる。
+worker_class = "gthread"
+workers = 1
+threads = 16
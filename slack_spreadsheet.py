@@ -1,19 +1,42 @@
 ﻿import os
 import re
-import json
-import openai
-import gspread
+import hashlib
+import random
+import collections
+import functools
+import logging
+
+# JSON のパースは高速な orjson があればそちらを使う (無ければ標準の json)
+try:
+    import orjson as json_fast
+except ImportError:
+    import json as json_fast
+
+# メッセージ本文の走査は、線形時間が保証される RE2 (google-re2) があればそちらを使う
+# (無ければ標準の re。パターンはどちらでも動く書き方にしている)
+try:
+    import re2 as re_fast
+except ImportError:
+    import re as re_fast
 
 from flask import Flask, request
 from slack_bolt import App
 from slack_bolt.adapter.flask import SlackRequestHandler
-from oauth2client.service_account import ServiceAccountCredentials
+from slack_sdk.http_retry.builtin_handlers import RateLimitErrorRetryHandler
 
-# 新規追加: ワークシートが無いときに発生する例外を扱うため
-from gspread.exceptions import WorksheetNotFound
+# openai / gspread / google-auth は import が重いため、
+# 起動を速くする目的で実際に使う関数の中で import する
 
 import datetime  # 日本時間への変換等に使うため
 import time      # リトライ時のスリープに使用（必要に応じて）
+import queue      # スプレッドシート書き込みのバッチ用キュー
+import threading  # バッチ書き込み用のバックグラウンドスレッド
+import atexit     # 終了時に未書き込みの行を書き込むため
+from concurrent.futures import ThreadPoolExecutor  # イベント処理をSlackへの応答と切り離すため
+
+# ログ出力の形式はここで1回だけ設定する
+logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 # ============================
 # Slack の認証情報 (環境変数)
@@ -24,20 +47,71 @@ SLACK_SIGNING_SECRET = os.environ["SLACK_SIGNING_SECRET"]
 # ============================
 # Google認証 (Secret Filesを利用)
 # ============================
-SERVICE_ACCOUNT_FILE = os.environ.get("GCP_SERVICE_ACCOUNT_JSON")  # Secret Filesパス
+# Secret Filesパス (または サービスアカウントのJSON文字列そのもの)
+SERVICE_ACCOUNT_FILE = os.environ.get("GCP_SERVICE_ACCOUNT_JSON")
 SPREADSHEET_KEY = os.environ.get("SPREADSHEET_KEY")  # スプレッドシートID
 
+SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+# サービスアカウントのJSONは実行中に変わらないので、起動時に1回だけ読み込む
+# 環境変数にJSONが直接入っている場合はファイルを読まずにそのままパースする
+SERVICE_ACCOUNT_INFO = None
+if SERVICE_ACCOUNT_FILE:
+    if SERVICE_ACCOUNT_FILE.lstrip().startswith("{"):
+        SERVICE_ACCOUNT_INFO = json_fast.loads(SERVICE_ACCOUNT_FILE)
+    else:
+        with open(SERVICE_ACCOUNT_FILE, "rb") as f:
+            SERVICE_ACCOUNT_INFO = json_fast.loads(f.read())
+
 # ============================
 # OpenAI APIキー
 # ============================
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-openai.api_key = OPENAI_API_KEY  # ここでセット
+OPENAI_MODEL = "gpt-4o-mini"
+# GPT の抽出結果を保存する SQLite ファイル (例: Render の永続ディスク /var/data/llm_cache.db)
+# 未設定ならメモリ上だけにキャッシュする (再起動で消える)
+LLM_CACHE_DB = os.environ.get("LLM_CACHE_DB")
+
+# OpenAI クライアントは初回のGPT呼び出し時に1つだけ作り、HTTP接続プールを使い回す
+# (スレッドプールから同時に呼ばれても、クライアント = 接続プールが複数できないようロックする)
+_OAI = None
+_OAI_LOCK = threading.Lock()
+
+def get_openai_client():
+    """
+    OpenAI クライアントを返す (初回のみ openai を import して生成)。
+    接続は httpx の keep-alive プールで使い回し、呼び出しごとのTLSハンドシェイクを省く。
+    """
+    global _OAI
+    if _OAI is None:
+        with _OAI_LOCK:
+            if _OAI is None:
+                import httpx
+                import openai
+                # 処理スレッド (_EXECUTOR) の数だけ接続を保持しておけば足りる
+                http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+                    timeout=10,
+                )
+                _OAI = openai.OpenAI(
+                    api_key=OPENAI_API_KEY, timeout=10, max_retries=2, http_client=http_client
+                )
+    return _OAI
 
 # Slack Bolt アプリを初期化
+# process_before_response=False: Slackへの 200 応答を先に返し、リスナーはその後に
+# 別スレッドで実行する (重い処理がSlackの3秒ルールに影響しないよう明示しておく)
 app_bolt = App(
     token=SLACK_BOT_TOKEN,
-    signing_secret=SLACK_SIGNING_SECRET
+    signing_secret=SLACK_SIGNING_SECRET,
+    process_before_response=False,
 )
+# Slack API のレート制限 (429) は Retry-After の秒数だけ待って再試行する
+app_bolt.client.retry_handlers.append(RateLimitErrorRetryHandler(max_retry_count=2))
 
 # Flask アプリ生成（Boltのイベントを受け取る用）
 flask_app = Flask(__name__)
@@ -46,52 +120,107 @@ handler = SlackRequestHandler(app=app_bolt)
 # -----------------------
 # Google Sheets クライアントの初期化
 # -----------------------
+# 認証済みクライアント・スプレッドシート・ワークシートはプロセス内で使い回す
+# (認証エラー時のみ reset_gspread_cache() で破棄して再認証)
+# これらに触るのはバッチ書き込みスレッド (write_worker) だけなのでロックは不要。
+# 他のスレッドから Sheets を操作する処理を追加する場合はロックを入れること。
+_CREDS = None
+_GC = None
+_SH = None
+_ALL_WORKSHEETS = None  # タイトル -> Worksheet (sh.worksheets() 1回分の一覧)
+_HEADER_DONE = set()    # ヘッダが正しいことを確認済みのワークシートのタイトル
+SHEETS_TIMEOUT = 30     # Sheets API 1回あたりのタイムアウト (秒)
+
+def get_credentials():
+    """
+    起動時に読み込んだサービスアカウント情報から認証情報を作る (初回のみ)。
+    """
+    global _CREDS
+    if _CREDS is None:
+        if not SERVICE_ACCOUNT_INFO:
+            raise ValueError("環境変数 GCP_SERVICE_ACCOUNT_JSON が設定されていません。")
+
+        from google.oauth2.service_account import Credentials
+        _CREDS = Credentials.from_service_account_info(SERVICE_ACCOUNT_INFO, scopes=SCOPES)
+    return _CREDS
+
 def get_gspread_client():
     """
-    Secret Filesによるサービスアカウントファイルを読み込み、
-    Googleスプレッドシートにアクセス可能なクライアントを返す
+    Googleスプレッドシートにアクセス可能なクライアントを返す (2回目以降はキャッシュを返す)
     """
-    if not SERVICE_ACCOUNT_FILE:
-        raise ValueError("環境変数 GCP_SERVICE_ACCOUNT_JSON が設定されていません。")
+    global _GC
+    if _GC is not None:
+        return _GC
+
+    import gspread
 
-    with open(SERVICE_ACCOUNT_FILE, "r", encoding="utf-8") as f:
-        service_account_dict = json.load(f)
+    # google-auth の認証情報を渡すと、gspread は AuthorizedSession (requests の
+    # keep-alive 接続プール) で通信するため、Sheets API 呼び出しごとのTLS接続を省ける
+    gc = gspread.authorize(get_credentials())
+    # 既定ではタイムアウトが無く、接続が止まると書き込みスレッドごと止まるため必ず設定する
+    gc.set_timeout(SHEETS_TIMEOUT)
+    _GC = gc
+    return _GC
+
+def get_spreadsheet():
+    """
+    SPREADSHEET_KEY のスプレッドシートを返す (初回のみ open_by_key を呼ぶ)。
+    """
+    global _SH
+    if _SH is None:
+        _SH = get_gspread_client().open_by_key(SPREADSHEET_KEY)
+    return _SH
+
+def get_worksheet(channel_name: str):
+    """
+    channel_name のワークシートを返す (2回目以降はキャッシュのみで API 呼び出しなし)。
+    """
+    return get_or_create_worksheet(get_spreadsheet(), channel_name)
+
+def reset_gspread_cache():
+    """
+    キャッシュしたクライアント類を破棄し、次回アクセス時に再認証させる。
+    (書き込み時の 401/403 や google-auth の RefreshError で呼ばれる)
+    """
+    global _GC, _SH
+    _GC = None
+    _SH = None
+    reset_worksheet_cache()
 
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    credentials = ServiceAccountCredentials.from_json_keyfile_dict(service_account_dict, scope)
-    gc = gspread.authorize(credentials)
-    return gc
+def reset_worksheet_cache():
+    """
+    ワークシート一覧とヘッダ確認済みの記録を破棄し、次回アクセス時に取り直させる。
+    (ワークシートが手作業で削除・改名された場合など、キャッシュが古くなったときに呼ばれる)
+    """
+    global _ALL_WORKSHEETS
+    _ALL_WORKSHEETS = None
+    _HEADER_DONE.clear()
 
 # -----------------------
 # 「【○○○様】」から医院名を抜き出す (現行コードを同一)
 # -----------------------
+RE_HOSPITAL = re_fast.compile(r"【([^】]+)】")  # 「【...】」の中身を取得
+
 def extract_hospital_name(text: str) -> str:
-    pattern = r"【([^】]+)】"  # 「【...】」の中身を取得
-    match = re.search(pattern, text)
+    match = RE_HOSPITAL.search(text)
     if not match:
         return ""
-    raw_name = match.group(1).strip()
-    if raw_name.endswith("様"):
-        raw_name = raw_name[:-1]
-    return raw_name
+    return match.group(1).strip().removesuffix("様")
 
 # -----------------------
 # 「○○○よりXXXXの応募がございました。」から媒体名を抜き出す (現行コードを同一)
 # -----------------------
+# 「より」以前をグループ1として取得
+# その後の任意の文字列の中に 「応募」 または 「見学希望」 があり、
+# 最後に「がございました。」で終わるパターンにマッチ
+RE_MEDIA = re_fast.compile(r"(.+?)より.+?(応募|見学希望)がございました。")
+
 def extract_media_name(text: str) -> str:
     """
     OOOより ◯◯◯(応募|見学希望)がございました。
     の場合に OOO をメディア名として取り出す
     """
-    # 「より」以前をグループ1として取得
-    # その後の任意の文字列の中に 「応募」 または 「見学希望」 があり、
-    # 最後に「がございました。」で終わるパターンにマッチ
-    pattern = r"(.+?)より.+?(応募|見学希望)がございました。"
-    match = re.search(pattern, text)
+    match = RE_MEDIA.search(text)
     if not match:
         return ""
     # group(1) が "より" より前、つまりメディア名
@@ -118,90 +247,396 @@ def empty_profile_dict() -> dict:
         "spot_dates": "",
     }
 
+# ============================
+# 定型文からのプロフィール抽出 (「・項目名：値」形式の行を1回の走査で拾う)
+# ============================
+_FIELD_MAP = {
+    "氏名": "name",
+    "会員番号": "member_id",
+    "年齢": "age",
+    "職種": "job",
+    "経験": "experience",
+    "お住まい": "address",
+    "就業状況": "status",
+    "資格": "cert",
+    "最終学歴": "education",
+    "スポット希望日": "spot_dates",
+}
+
+def parse_profile_info_by_lines(text: str) -> dict:
+    """
+    「・氏名：山田 太郎」のような行を1行ずつ分解して抽出する。
+    行の形式が固定なので正規表現は使わず、文字列操作だけで処理する。
+    見つからない項目は空文字のまま。
+    """
+    data = empty_profile_dict()
+    for line in text.split("\n"):
+        if not line.startswith("・"):
+            continue
+        key, sep, value = line[1:].partition("：")
+        field = _FIELD_MAP.get(key.strip())
+        if sep and field:
+            data[field] = value.strip()
+    # 年齢は数字のみ (「歳」などを除く)
+    data["age"] = "".join(ch for ch in data["age"] if ch.isdigit())
+    return data
+
 # -----------------------
 # OpenAIを用いてプロフィール情報を抽出 (堅牢版)
 # -----------------------
+# プロフィールの項目名 (スプレッドシートの4列目以降と同じ順。キャッシュもこの順のタプルで保持する)
+PROFILE_KEYS = tuple(empty_profile_dict())
+
+# 定型文からこれらの項目がすべて取れたら GPT は呼ばない
+REQUIRED_PROFILE_KEYS = ("name", "member_id", "age")
+
+# 氏名・会員番号らしき記載が本文に無い場合、GPTでも name / member_id はまず取れず
+# (取れなければ行は書き込まれない)、GPT を呼ぶだけ無駄になる
+RE_LIKELY_PROFILE = re_fast.compile(r"氏名|名前|会員番号|ID")
+
+# 定型文で済んだ件数 / GPTにフォールバックした件数 (フォールバック率の監視用)
+_parse_stats = collections.Counter()
+_parse_stats_lock = threading.Lock()
+
 def parse_profile_info(text: str) -> dict:
     """
-    GPT呼び出しを最大2回リトライし、それでも失敗時は必須キーを含む空dictを返す。
-    """
-    # 1. OpenAIキーが無い場合は空辞書を返す
-    if not OPENAI_API_KEY:
-        return empty_profile_dict()
-
-    system_prompt = (
-        "あなたはテキストから以下の情報を抽出するアシスタントです。\n"
-        "抽出すべき項目: name(氏名), member_id(会員番号), age(年齢), "
-        "job(職種), experience(経験), address(お住まい), status(就業状況), "
-        "cert(資格), education(最終学歴), spot_dates(スポット希望日)\n"
-        "職種(job)には括弧内の情報(例: (正社員))も含めてください。\n"
-        "経験(experience)には職歴情報をすべて文字列としてまとめてください。\n"
-        "spot_dates(スポット希望日)があれば、複数日でも1つの文字列にまとめてください。\n"
-        "年齢(age)は「歳」を除いて数字のみ出力してください。\n"
-        "出力は必ず JSON 形式のみで、キー名は上記の英語でお願いします。\n"
-        "値が不明の場合は空文字にしてください。"
+    まず定型文 (「・項目名：値」) から抽出し、必須項目が欠けている場合のみGPTを呼ぶ。
+    GPTの結果は定型文で取れなかった項目の補完にだけ使う。
+    GPT呼び出しに失敗した場合は定型文から取れた分を返す。
+    同じ本文の再送 (Slackのリトライ等) はキャッシュから返し、GPTを呼び直さない。
+    """
+    # 1. 必須項目が定型文で取れた場合、またはOpenAIキーが無い場合はそのまま返す
+    data = parse_profile_info_by_lines(text)
+    if not OPENAI_API_KEY or all(data[k] for k in REQUIRED_PROFILE_KEYS):
+        with _parse_stats_lock:
+            _parse_stats["template"] += 1
+        return data
+
+    # 2. 氏名・会員番号が取れそうにない本文は GPT を呼ばない
+    if not (data["name"] or data["member_id"]) and not RE_LIKELY_PROFILE.search(text):
+        with _parse_stats_lock:
+            _parse_stats["skipped"] += 1
+        return data
+
+    # 全件数には GPT を呼ばなかった件数 (template / skipped) も含める
+    with _parse_stats_lock:
+        _parse_stats["llm"] += 1
+        llm_count = _parse_stats["llm"]
+        total_count = sum(_parse_stats.values())
+    logger.info(
+        "定型文で必須項目が取れないためGPTで抽出します (GPT %d件 / 全%d件)",
+        llm_count, total_count,
     )
-    user_prompt = f"以下のテキストから必要項目を抜き出して、JSON形式で返してください。\n\n{text}\n"
 
-    # 2. リトライロジック
-    for attempt in range(2):  # 最大2回
+    key = llm_cache_key(text)
+    extracted = _llm_cache.get(key)
+    if extracted is None:
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.0,
+            extracted = parse_profile_info_by_openai(text)
+        except RuntimeError as e:
+            logger.warning("%s", e)
+            # 失敗なら、定型文から取れた分だけ返す (失敗結果はキャッシュしない)
+            return data
+        _llm_cache.set(key, extracted)
+
+    # 定型文で取れた値を優先し、空の項目だけGPTの結果で埋める
+    for k, v in zip(PROFILE_KEYS, extracted):
+        if not data[k]:
+            data[k] = v
+    return data
+
+# ============================
+# GPT の抽出結果キャッシュ (Slackの再送や同一本文の再投稿でGPTを呼び直さない)
+# ============================
+class LLMCache:
+    """
+    キー -> (値, 保存時刻) を保持する、件数上限 (LRU) と有効期限 (TTL) 付きのキャッシュ。
+    スレッドプールから同時に使われるためロックで保護する。
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: int = 86400):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+class SQLiteLLMCache:
+    """
+    LLMCache と同じ get / set を持つ、SQLite ファイルに保存するキャッシュ。
+    ワーカーの再起動・デプロイ後も結果が残る。値は PROFILE_KEYS 順のタプル。
+    接続は1つをロックで共有する (スレッドプールから同時に使われるため)。
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 86400):
+        import sqlite3
+
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value BLOB, created REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created)")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return tuple(json_fast.loads(row[0]))
+
+    def set(self, key: str, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)",
+                (key, json_fast.dumps(list(value)), now),
             )
-            content = response["choices"][0]["message"]["content"].strip()
-            extracted_data = json.loads(content)
+            # 期限切れの行はここで消す (ファイルが増え続けないように)
+            self._conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_seconds,))
 
-            # 年齢は数字のみ
-            age_str = extracted_data.get("age", "")
-            extracted_data["age"] = re.sub(r"\D", "", age_str)
+if LLM_CACHE_DB:
+    _llm_cache = SQLiteLLMCache(LLM_CACHE_DB, ttl_seconds=86400)
+else:
+    _llm_cache = LLMCache(maxsize=1024, ttl_seconds=86400)
 
-            # 必須キー以外は無視。必須キーがあれば取り出し、無ければ空文字
-            safe_data = empty_profile_dict()
-            for k in safe_data.keys():
-                safe_data[k] = extracted_data.get(k, "")
+# 項目名・項目ごとの注意点・出力形式はスキーマ (PROFILE_RESPONSE_FORMAT) 側で指定するので、
+# プロンプトは最小限にする (入力トークンを減らすため)
+SYSTEM_PROMPT = "テキストから応募者の情報を抽出してください。値が不明の場合は空文字にしてください。"
+# ユーザーメッセージの定型部分。可変の本文は必ず末尾に付け、
+# システムプロンプトからここまでを毎回バイト単位で同一に保つ (OpenAI のプロンプトキャッシュ用)
+USER_PROMPT_PREFIX = "以下のテキストから必要項目を抜き出してください。\n\n"
 
-            return safe_data
+# 各項目の description (テンプレート上の日本語の項目名 + 抽出時の注意点)
+_FIELD_DESCRIPTIONS = {key: label for label, key in _FIELD_MAP.items()}
+_FIELD_DESCRIPTIONS.update({
+    "age": "年齢。「歳」を除いた数字のみ",
+    "job": "職種。括弧内の情報(例: (正社員))も含める",
+    "experience": "経験。職歴情報をすべて1つの文字列にまとめる",
+    "spot_dates": "スポット希望日。複数日でも1つの文字列にまとめる",
+})
 
-        except Exception as e:
-            print(f"OpenAI API error (attempt {attempt+1}): {e}")
-            # 一時的なエラーかもしれないので短いスリープ
-            time.sleep(1.0)
+# Structured Outputs 用のスキーマ (全項目が文字列で必ず存在する JSON を保証させる)
+PROFILE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "profile",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                key: {"type": "string", "description": _FIELD_DESCRIPTIONS[key]}
+                for key in PROFILE_KEYS
+            },
+            "required": list(PROFILE_KEYS),
+            "additionalProperties": False,
+        },
+    },
+}
 
-    # 3. 2回とも失敗なら、必須キーだけ空で返す
-    return empty_profile_dict()
+def normalize_text(text: str) -> str:
+    """
+    各行の前後の空白と空行を除く (GPTへ送るトークンを減らし、
+    転送・再投稿で空白だけ違う本文も同じキャッシュキーにする)。
+    """
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+# 応答の最大トークン数 (全項目が入る JSON に足りる程度に抑え、暴走時の待ち時間を防ぐ)
+PROFILE_MAX_TOKENS = 1024
+# GPTへ送る本文の最大文字数 (異常に長いメッセージで遅延・コストが膨らまないようにする)
+PROFILE_MAX_INPUT_CHARS = 8000
+
+def llm_cache_key(text: str) -> str:
+    """
+    モデル名・システムプロンプト・スキーマ・本文から キャッシュキー (sha256) を作る。
+    モデルやプロンプトを変えると別のキーになり、古い結果は使われない。
+    """
+    return hashlib.sha256(
+        "\0".join((
+            OPENAI_MODEL, SYSTEM_PROMPT, USER_PROMPT_PREFIX,
+            repr(PROFILE_RESPONSE_FORMAT), normalize_text(text),
+        )).encode("utf-8")
+    ).hexdigest()
+
+def parse_profile_info_by_openai(text: str) -> tuple:
+    """
+    GPTで抽出した結果を PROFILE_KEYS 順のタプルで返す。
+    失敗した場合は RuntimeError を送出する。
+    429 / 5xx / 接続エラーの再試行はクライアント (max_retries) に任せる。
+    Structured Outputs で JSON の形は保証されるので、解析失敗のための再試行はしない。
+    """
+    body = normalize_text(text)
+    if len(body) > PROFILE_MAX_INPUT_CHARS:
+        # 応募者情報は本文の先頭側にあるので、長すぎる本文は後ろを切り捨てる
+        logger.info("本文が長いため %d 文字に切り詰めてGPTへ送ります (元: %d 文字)", PROFILE_MAX_INPUT_CHARS, len(body))
+        body = body[:PROFILE_MAX_INPUT_CHARS]
+    user_prompt = f"{USER_PROMPT_PREFIX}{body}\n"
+
+    try:
+        response = get_openai_client().chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.0,
+            max_tokens=PROFILE_MAX_TOKENS,
+            response_format=PROFILE_RESPONSE_FORMAT,
+        )
+    except Exception as e:
+        raise RuntimeError(f"OpenAI によるプロフィール抽出に失敗しました: {e}") from e
+
+    # プロンプトキャッシュが効いているかの確認用 (先頭1024トークン以上が同一の場合のみ効く)
+    # GPT呼び出しはフォールバック時だけで件数が少ないので INFO で出す
+    # usage は省略されることがあるので、無い場合は出さない (ログのために抽出を失敗させない)
+    usage = response.usage
+    if usage is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        logger.info(
+            "OpenAI usage: prompt=%s (cached=%s) completion=%s",
+            usage.prompt_tokens, getattr(details, "cached_tokens", 0) or 0, usage.completion_tokens,
+        )
+
+    # max_tokens で打ち切られた場合は JSON が途中で切れているので使わない
+    choice = response.choices[0]
+    if choice.finish_reason != "stop":
+        raise RuntimeError(f"OpenAI の応答が完了しませんでした (finish_reason={choice.finish_reason})")
+
+    # Structured Outputs でも、モデルが回答を拒否した場合は content が None になる
+    message = choice.message
+    if getattr(message, "refusal", None) or message.content is None:
+        raise RuntimeError(f"OpenAI が抽出を拒否しました: {getattr(message, 'refusal', None)}")
+
+    # 解析・後処理の失敗も RuntimeError にそろえ、呼び出し側で定型文の結果へ戻れるようにする
+    try:
+        # Structured Outputs なので応答は通常スキーマどおりの JSON (前後の空白除去などは不要)
+        extracted_data = json_fast.loads(message.content)
+
+        # 年齢は数字のみ (数値で返ってきた場合も文字列にしてから数字だけ残す)
+        age_str = str(extracted_data.get("age", ""))
+        extracted_data["age"] = "".join(ch for ch in age_str if ch.isdigit())
+
+        # 必須キー以外は無視。必須キーがあれば取り出し、無ければ空文字
+        return tuple(extracted_data.get(k, "") for k in PROFILE_KEYS)
+    except Exception as e:
+        raise RuntimeError(f"OpenAI の応答を解析できませんでした: {e}") from e
 
 # ============================
-# 追加: ヘッダを常に確認・補正
+# 追加: ヘッダを確認・補正
 # ============================
+HEADER_FORMULA = "=SUBTOTAL(103,A3:A1000)"
+# 行の組み立て (_process_application) と同じ並び: 医院名・日付・媒体名 + PROFILE_KEYS
+# プロフィール項目は PROFILE_KEYS から作り、ヘッダと行の列順がずれないようにする
+EXPECTED_HEADER = [
+    "hospital_name",
+    "slack_timestamp",
+    "media_name",
+    *PROFILE_KEYS,
+]
+
+def column_letter(n: int) -> str:
+    """
+    1始まりの列番号を列記号にする (1 -> A, 13 -> M, 27 -> AA)。
+    gspread.utils と同じ変換だが、gspread の遅延 import を崩さないよう自前で行う。
+    """
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+# ヘッダの最終列 (項目を増やしても書き込み・確認の範囲が自動で追従する)
+HEADER_END_COL = column_letter(len(EXPECTED_HEADER))
+
 def ensure_header(worksheet):
     """
     1行目は =SUBTOTAL(103,A3:A1000)、
-    2行目(A2:M2) はヘッダを書き込む
-    """
-    expected_header = [
-        "hospital_name",
-        "slack_timestamp",
-        "media_name",
-        "name",
-        "member_id",
-        "age",
-        "job",
-        "experience",
-        "address",
-        "status",
-        "cert",
-        "education",
-        "spot_dates",
-    ]
-
-    worksheet.update_acell('A1', '=SUBTOTAL(103,A3:A1000)')
-    worksheet.update('A2:M2', [expected_header])
+    2行目(A2 から HEADER_END_COL まで) はヘッダを書き込む (values.batchUpdate 1回で両方書く)
+    """
+    worksheet.batch_update(
+        [
+            {"range": "A1", "values": [[HEADER_FORMULA]]},
+            {"range": f"A2:{HEADER_END_COL}2", "values": [EXPECTED_HEADER]},
+        ],
+        value_input_option="USER_ENTERED",
+    )
+
+def find_titles_with_header(sh, titles) -> set:
+    """
+    titles の各ワークシートの A1 から HEADER_END_COL 列の2行目までを1回の values_batch_get でまとめて読み、
+    ヘッダが正しく入っているワークシートのタイトルを返す。
+    """
+    if not titles:
+        return set()
+    ranges = ["'{}'!A1:{}2".format(title.replace("'", "''"), HEADER_END_COL) for title in titles]
+    result = sh.values_batch_get(ranges, params={"valueRenderOption": "FORMULA"})
+    done = set()
+    for title, value_range in zip(titles, result.get("valueRanges", [])):
+        values = value_range.get("values", [])
+        if len(values) >= 2 and values[0][:1] == [HEADER_FORMULA] and values[1] == EXPECTED_HEADER:
+            done.add(title)
+    return done
+
+def add_worksheet_with_header(sh, sheet_title: str):
+    """
+    ワークシートの追加 (addSheet) と A1/A2 のヘッダ書き込み (updateCells) を
+    1回の batch_update で行う。
+    同じリクエスト内でヘッダを書くため、sheetId は既存と重ならない値をこちらで決める。
+    """
+    import gspread
+
+    used_ids = {ws.id for ws in _ALL_WORKSHEETS.values()}
+    sheet_id = random.randrange(1, 2**31)
+    while sheet_id in used_ids:
+        sheet_id = random.randrange(1, 2**31)
+
+    body = {"requests": [
+        {
+            "addSheet": {
+                "properties": {
+                    "sheetId": sheet_id,
+                    "title": sheet_title,
+                    "gridProperties": {"rowCount": 100, "columnCount": max(35, len(EXPECTED_HEADER))},
+                }
+            }
+        },
+        {
+            "updateCells": {
+                "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                "rows": [
+                    {"values": [to_cell(HEADER_FORMULA)]},
+                    {"values": [to_cell(h) for h in EXPECTED_HEADER]},
+                ],
+                "fields": "userEnteredValue",
+            }
+        },
+    ]}
+    result = sh.batch_update(body)
+    # gspread 6 では spreadsheet_id と client も渡す必要がある (Spreadsheet.add_worksheet と同じ形)
+    return gspread.Worksheet(sh, result["replies"][0]["addSheet"]["properties"], sh.id, sh.client)
 
 # ============================
 # 追加: チャンネル用ワークシートを取得 or 作成する関数
@@ -209,109 +644,443 @@ def ensure_header(worksheet):
 def get_or_create_worksheet(sh, sheet_title: str):
     """
     sheet_title に一致するワークシートを探し。
-    なければ新規作成し、A1=SUBTOTAL, A2=ヘッダをセット。
+    なければ新規作成し、A1=SUBTOTAL, A2=ヘッダをセット (1回の batch_update)。
+    既存ワークシートの一覧と各ヘッダの確認は、初回にまとめて
+    (sh.worksheets() と values_batch_get の2回で) 行い、以降は使い回す。
     """
-    try:
-        worksheet = sh.worksheet(sheet_title)
-    except WorksheetNotFound:
-        worksheet = sh.add_worksheet(title=sheet_title, rows=100, cols=35)
+    global _ALL_WORKSHEETS
+    if _ALL_WORKSHEETS is None:
+        _ALL_WORKSHEETS = {ws.title: ws for ws in sh.worksheets()}
+        _HEADER_DONE.update(find_titles_with_header(sh, list(_ALL_WORKSHEETS)))
+
+    worksheet = _ALL_WORKSHEETS.get(sheet_title)
+    if worksheet is None:
+        worksheet = add_worksheet_with_header(sh, sheet_title)
+        _ALL_WORKSHEETS[sheet_title] = worksheet
+        _HEADER_DONE.add(sheet_title)
 
-    ensure_header(worksheet)
+    if sheet_title not in _HEADER_DONE:
+        ensure_header(worksheet)
+        _HEADER_DONE.add(sheet_title)
     return worksheet
 
 # -----------------------
-# スプレッドシートへ書き込み (現行のwrite_to_spreadsheetを置き換え)
+# 値を appendCells 用のセルに変換 (このボットが書く値について USER_ENTERED に近い解釈をする)
+# -----------------------
+_DATE_RE = re.compile(r"(\d{4})([-/])(\d{1,2})\2(\d{1,2})")
+_NUMBER_RE = re.compile(r"-?\d+(\.\d+)?")
+_SHEETS_EPOCH = datetime.date(1899, 12, 30)  # スプレッドシートの日付シリアル値の起点
+_CELL_FIELDS = "userEnteredValue,userEnteredFormat.numberFormat"
+
+def to_cell(value) -> dict:
+    """
+    値を appendCells 用のセルデータにする。USER_ENTERED の解釈のうち、
+    このボットが書く値で起こるものだけを再現する:
+      - 「=」で始まる値は数式
+      - 先頭の「'」は取り除いて文字列のまま (例: '0123)
+      - YYYY-MM-DD / YYYY/M/D は日付 (表示形式は入力と同じ区切り)
+      - 整数・小数は数値
+    それ以外 (1,000 / 25% / TRUE / 年なしの 1/15 など) は、USER_ENTERED と違い文字列のまま書く。
+    spot_dates に「2024/1/15」のような単独の日付だけが入っている場合は日付になるが、
+    複数日や曜日付きの値は文字列になる。
+    """
+    text = "" if value is None else str(value)
+    if text == "":
+        return {}
+    if text.startswith("="):
+        return {"userEnteredValue": {"formulaValue": text}}
+    if text.startswith("'"):
+        return {"userEnteredValue": {"stringValue": text[1:]}}
+    match = _DATE_RE.fullmatch(text)
+    if match:
+        year, sep, month, day = match.groups()
+        try:
+            serial = (datetime.date(int(year), int(month), int(day)) - _SHEETS_EPOCH).days
+            return {
+                "userEnteredValue": {"numberValue": serial},
+                "userEnteredFormat": {
+                    "numberFormat": {"type": "DATE", "pattern": "yyyy-mm-dd" if sep == "-" else "yyyy/mm/dd"}
+                },
+            }
+        except ValueError:
+            pass
+    if _NUMBER_RE.fullmatch(text):
+        return {"userEnteredValue": {"numberValue": float(text)}}
+    return {"userEnteredValue": {"stringValue": text}}
+
+# -----------------------
+# Sheets API の一時的なエラー (429 / 5xx・接続エラー) は待ってから再試行する
+# -----------------------
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+BACKOFF_MAX_ATTEMPTS = 5
+BACKOFF_MAX_WAIT = 30.0  # 1回の待ち時間の上限 (秒)
+
+def with_backoff(fn):
+    """
+    gspread の APIError が 429 / 5xx の場合、または接続エラーの場合、
+    Retry-After (無ければ 2^attempt 秒、上限 BACKOFF_MAX_WAIT 秒) にジッターを足した時間だけ待って、
+    最大 BACKOFF_MAX_ATTEMPTS 回まで呼び直す。
+    読み取りタイムアウト (ReadTimeout) は書き込みが成功している可能性があり、
+    再試行すると行が重複しうるので再試行しない。
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        from gspread.exceptions import APIError
+        from requests.exceptions import ConnectionError as RequestsConnectionError
+
+        for attempt in range(BACKOFF_MAX_ATTEMPTS):
+            retry_after = None
+            try:
+                return fn(*args, **kwargs)
+            except APIError as e:
+                reason = e.response.status_code
+                if reason not in RETRYABLE_STATUS or attempt == BACKOFF_MAX_ATTEMPTS - 1:
+                    raise
+                retry_after = e.response.headers.get("Retry-After")
+            except RequestsConnectionError as e:
+                reason = type(e).__name__
+                if attempt == BACKOFF_MAX_ATTEMPTS - 1:
+                    raise
+
+            try:
+                wait = float(retry_after) if retry_after is not None else 2 ** attempt
+            except ValueError:
+                wait = 2 ** attempt
+            wait = min(wait, BACKOFF_MAX_WAIT) + random.random()
+            logger.warning("Sheets API %s のため %.1f 秒後に再試行します (%d回目)", reason, wait, attempt + 1)
+            time.sleep(wait)
+    return wrapper
+
+# -----------------------
+# スプレッドシートへ書き込み (全ワークシート分を1回の batchUpdate で追加)
+# -----------------------
+@with_backoff
+def write_batches_to_spreadsheet(batches: dict):
+    """
+    {チャンネル名: 行のリスト} を、チャンネルごとの appendCells リクエストにまとめ、
+    spreadsheets.batchUpdate 1回で全ワークシートへ追加する。
+    認証エラー (401/403・トークン更新失敗) の場合はキャッシュを破棄し、
+    再認証して1回だけ再試行する。400/404 の場合はワークシート一覧だけを取り直して
+    1回だけ再試行する。
+    """
+    from gspread.exceptions import APIError
+    from google.auth.exceptions import RefreshError
+
+    for attempt in range(2):
+        try:
+            body = {"requests": [
+                {
+                    "appendCells": {
+                        "sheetId": get_worksheet(channel_name).id,
+                        "rows": [{"values": [to_cell(v) for v in row]} for row in rows],
+                        "fields": _CELL_FIELDS,
+                    }
+                }
+                for channel_name, rows in batches.items()
+            ]}
+            get_spreadsheet().batch_update(body)
+            return
+        except (APIError, RefreshError) as e:
+            if attempt > 0:
+                raise
+            status = None if isinstance(e, RefreshError) else e.response.status_code
+            if status is None or status in (401, 403):
+                reset_gspread_cache()
+            elif status in (400, 404):
+                # キャッシュしたワークシート (sheetId) が削除されている可能性がある
+                reset_worksheet_cache()
+            else:
+                raise
+
+# ============================
+# バッチ書き込み: キューに溜めてバックグラウンドでまとめて書き込む
+# ============================
+# Sheets API の書き込み上限 (1分あたり60回) を超えないよう、フラッシュは最短でも1秒間隔にする
+# (件数がすぐ溜まる場合も前回のフラッシュから BATCH_MIN_INTERVAL 秒は待つ)
+BATCH_MAX_ROWS = 25       # この件数が溜まったら書き込み
+BATCH_MAX_WAIT = 1.0      # 最初の1件からこの秒数が経過したら書き込み
+BATCH_MIN_INTERVAL = 1.0  # 前回のフラッシュからの最短間隔
+
+# 要素は (channel_name, row, say, thread_ts)
+_write_queue = queue.Queue()
+_STOP = object()  # 終了時にワーカーへ残りの書き込みを指示する目印
+
+# スレッドへの返信 (chat.postMessage) は書き込みスレッドとは別のスレッドで送る
+# (429 で Retry-After 待ちになっても、Sheets への書き込みが止まらないようにする)
+_REPLY_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+def send_reply(say, text: str, thread_ts: str):
+    try:
+        say(text=text, thread_ts=thread_ts)
+    except Exception:
+        logger.exception("Slackへの返信に失敗しました。")
+
+def queue_reply(say, text: str, thread_ts: str):
+    """
+    返信を _REPLY_EXECUTOR に渡す。終了処理中でプールが使えない場合はその場で送る。
+    """
+    try:
+        _REPLY_EXECUTOR.submit(send_reply, say, text, thread_ts)
+    except RuntimeError:
+        send_reply(say, text, thread_ts)
+
+def flush_pending(pending: dict):
+    """
+    チャンネル名ごとに溜まった行を1回の API 呼び出しでまとめて書き込み、
+    各メッセージのスレッドへの結果の返信を _REPLY_EXECUTOR に渡す。
+    """
+    items = [item for channel_items in pending.values() for item in channel_items]
+    try:
+        write_batches_to_spreadsheet(
+            {channel_name: [item[1] for item in channel_items]
+             for channel_name, channel_items in pending.items()}
+        )
+    except Exception as e:
+        # logger.exception はスタックトレースも出力する
+        logger.exception("スプレッドシートへの書き込みでエラーが発生: %s", e)
+        for _, _, say, thread_ts in items:
+            queue_reply(say, f"スプレッドシートへの書き込みでエラー: {e}", thread_ts)
+        return
+
+    logger.info("スプレッドシートへの書き込みに成功しました。(%d件)", len(items))
+    for _, _, say, thread_ts in items:
+        queue_reply(say, "スプレッドシート書き込みが完了しました。", thread_ts)
+
+def write_worker():
+    """
+    キューから行を取り出してチャンネルごとに溜め、
+    BATCH_MAX_ROWS 件に達するか BATCH_MAX_WAIT 秒経過したらまとめて書き込む。
+    ただし前回のフラッシュから BATCH_MIN_INTERVAL 秒経つまでは書き込まない。
+    _STOP を受け取ったら溜まっている分を書き込んで終了する。
+    """
+    pending = {}
+    count = 0
+    first_at = None
+    last_flush_at = 0.0
+    stopping = False
+    while not stopping:
+        try:
+            item = _write_queue.get(timeout=0.05)
+            if item is _STOP:
+                stopping = True
+            else:
+                pending.setdefault(item[0], []).append(item)
+                count += 1
+                if first_at is None:
+                    first_at = time.monotonic()
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        if pending and (
+            stopping
+            or ((count >= BATCH_MAX_ROWS or now - first_at >= BATCH_MAX_WAIT)
+                and now - last_flush_at >= BATCH_MIN_INTERVAL)
+        ):
+            try:
+                flush_pending(pending)
+            except Exception:
+                # Slackへの返信失敗などでワーカーが止まらないようにする
+                logger.exception("バッチ書き込みワーカーでエラー")
+            # 間隔はフラッシュの終了時点から数える (再試行で長引いた場合も詰めて書かない)
+            last_flush_at = time.monotonic()
+            pending = {}
+            count = 0
+            first_at = None
+
+_writer_thread = threading.Thread(target=write_worker, name="sheets-writer", daemon=True)
+_writer_thread.start()
+
+@atexit.register
+def stop_write_worker():
+    """
+    プロセス終了時に、キューに残っている行を書き込んでからワーカーを止める。
+    (daemon スレッドのままだと、溜まっていた行が失われるため)
+    """
+    _write_queue.put(_STOP)
+    _writer_thread.join(timeout=10)
+
+# ============================
+# 処理済みイベントID (Slackのリトライによる重複処理を防ぐ)
+# ============================
+SEEN_EVENTS_MAX = 4096
+_seen_event_ids = collections.OrderedDict()
+_seen_event_ids_lock = threading.Lock()  # gthread ワーカーでは複数スレッドから呼ばれる
+
+def is_duplicate_event(event_id) -> bool:
+    """
+    event_id が直近 SEEN_EVENTS_MAX 件の中で処理済みなら True。
+    未処理なら記録して False を返す。
+    """
+    if not event_id:
+        return False
+    with _seen_event_ids_lock:
+        if event_id in _seen_event_ids:
+            return True
+        _seen_event_ids[event_id] = None
+        if len(_seen_event_ids) > SEEN_EVENTS_MAX:
+            _seen_event_ids.popitem(last=False)
+    return False
+
+# ============================
+# チャンネルID -> チャンネル名 のキャッシュ
+# ============================
+CHANNEL_NAME_TTL = 3600        # 取得できた名前は1時間使い回す
+CHANNEL_NAME_ERROR_TTL = 60    # 取得失敗 (権限不足など) は60秒間再取得しない
+_channel_name_cache = {}       # channel_id -> (name, 有効期限)
+
+def get_channel_name(channel_id: str) -> str:
+    """
+    conversations_info でチャンネル名を取得する (結果はキャッシュして使い回す)。
+    取得できない場合は UnknownChannel_<ID> を返す。
+    """
+    cached = _channel_name_cache.get(channel_id)
+    if cached and cached[1] > time.time():
+        return cached[0]
+
+    # チャンネル名取得 (権限不足の場合は例外発生)
+    try:
+        channel_info = app_bolt.client.conversations_info(channel=channel_id)
+        name = channel_info["channel"]["name"]
+        ttl = CHANNEL_NAME_TTL
+    except Exception as e:
+        logger.error("チャンネル名の取得に失敗: %s", e)
+        name = f"UnknownChannel_{channel_id}"
+        ttl = CHANNEL_NAME_ERROR_TTL
+
+    _channel_name_cache[channel_id] = (name, time.time() + ttl)
+    return name
+
+# -----------------------
+# チャンネル名の変更イベント: ペイロードの新しい名前でキャッシュを更新する
+# (Slackアプリの Event Subscriptions で channel_rename / group_rename の購読が必要)
 # -----------------------
-def write_to_spreadsheet(data: dict):
-    """
-    ディクショナリ data の内容をスプレッドシートに1行追加する。
-    """
-    gc = get_gspread_client()
-    sh = gc.open_by_key(SPREADSHEET_KEY)
-
-    channel_name = data.get("channel_name", "UnknownChannel")
-    worksheet = get_or_create_worksheet(sh, channel_name)
-
-    new_row = [
-        data.get("hospital_name", ""),
-        data.get("slack_timestamp", ""),
-        data.get("media_name", ""),
-        data.get("name", ""),
-        data.get("member_id", ""),
-        data.get("age", ""),
-        data.get("job", ""),
-        data.get("experience", ""),
-        data.get("address", ""),
-        data.get("status", ""),
-        data.get("cert", ""),
-        data.get("education", ""),
-        data.get("spot_dates", ""),
-    ]
-    worksheet.append_row(new_row, value_input_option="USER_ENTERED")
+@app_bolt.event("channel_rename")
+@app_bolt.event("group_rename")
+def handle_channel_rename(event):
+    channel = event.get("channel", {})
+    if channel.get("id") and channel.get("name"):
+        _channel_name_cache[channel["id"]] = (channel["name"], time.time() + CHANNEL_NAME_TTL)
+
+# 日本時間 (夏時間が無いので固定オフセットで十分。tzdata も不要)
+JST = datetime.timezone(datetime.timedelta(hours=9), "JST")
+
+# OpenAI・Slack API を伴う重い処理はこのスレッドプールで実行する
+_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+# チャンネル名の取得は _EXECUTOR のタスクから投げるため別のプールにする
+# (同じプールだと、全スレッドが子タスクの完了待ちで詰まる恐れがある)
+_LOOKUP_EXECUTOR = ThreadPoolExecutor(max_workers=4)
 
 # -----------------------
-# Slack Bolt: メッセージイベントのハンドラ (現行コード同一)
+# Slack Bolt: メッセージイベントのハンドラ
 # -----------------------
 @app_bolt.event("message")
-def handle_message_events(body, say, logger):
+def handle_message_events(ack, body, say):
+    # Slackの3秒ルールに間に合うよう、まず応答してから処理をスレッドプールへ渡す
+    ack()
+
     event = body.get("event", {})
+
+    # 再送されたイベントは解析・書き込みの前に捨てる
+    # (event_id が無いペイロードでは client_msg_id、それも無ければ チャンネル+ts で判定)
+    dedup_key = (
+        body.get("event_id")
+        or event.get("client_msg_id")
+        or (f"{event.get('channel')}:{event.get('ts')}" if event.get("ts") else None)
+    )
+    if is_duplicate_event(dedup_key):
+        return
+
     text = event.get("text", "")
-    thread_ts = event.get("ts")
-    channel_id = event.get("channel")
 
-    # ★「応募...がございました。」または「見学希望がございました。」なら処理
-    if ("がございました。" in text) and ("応募" in text or "見学希望" in text):
-        hospital_name = extract_hospital_name(text)
-        media_name = extract_media_name(text)
+    # ★「応募...がございました。」または「見学希望がございました。」以外は
+    #   抽出処理に入る前に即座に返す (雑談などは文字列検索のみで終わる)
+    if "がございました。" not in text or ("応募" not in text and "見学希望" not in text):
+        return
 
-        # 堅牢版 parse_profile_info (必ず必須キーを含むdictが返る)
-        parsed_profile = parse_profile_info(text)
+    # ワーカーには必要な値だけを渡す (イベント全体の body は保持しない)
+    _EXECUTOR.submit(process_application, text, event.get("channel"), event.get("ts"), say)
 
-        # Slackのtsを日時文字列(YYYY-MM-DD)に変換
-        slack_timestamp_str = ""
-        if thread_ts:
-            try:
-                dt = datetime.datetime.fromtimestamp(float(thread_ts))
-                dt_jst = dt + datetime.timedelta(hours=9)
-                slack_timestamp_str = dt_jst.strftime("%Y-%m-%d")
-            except:
-                pass
-
-        merged_data = {
-            "hospital_name": hospital_name,
-            "slack_timestamp": slack_timestamp_str,
-            "media_name": media_name,
-            **parsed_profile
-        }
-
-        # チャンネル名取得 (権限不足の場合は例外発生)
+def process_application(text: str, channel_id: str, thread_ts: str, say):
+    """
+    応募メッセージから各項目を抽出し、書き込みキューへ積む (スレッドプール上で実行)。
+    """
+    try:
+        _process_application(text, channel_id, thread_ts, say)
+    except Exception:
+        # Future に例外が埋もれないようにここでログへ出す
+        logger.exception("メッセージ処理中にエラーが発生しました。")
+
+def _process_application(text: str, channel_id: str, thread_ts: str, say):
+    # チャンネル名の取得 (Slack API) はGPT呼び出しと互いに依存しないので並行して行う
+    channel_name_future = _LOOKUP_EXECUTOR.submit(get_channel_name, channel_id)
+
+    hospital_name = extract_hospital_name(text)
+    media_name = extract_media_name(text)
+
+    # 堅牢版 parse_profile_info (必ず必須キーを含むdictが返る)
+    parsed_profile = parse_profile_info(text)
+
+    # Slackのtsを日本時間の日付文字列(YYYY-MM-DD)に変換 (サーバーのタイムゾーンに依存しない)
+    slack_timestamp_str = ""
+    if thread_ts:
         try:
-            channel_info = app_bolt.client.conversations_info(channel=channel_id)
-            slack_channel_name = channel_info["channel"]["name"]
-        except Exception as e:
-            logger.error(f"チャンネル名の取得に失敗: {e}")
-            slack_channel_name = f"UnknownChannel_{channel_id}"
+            slack_timestamp_str = datetime.datetime.fromtimestamp(float(thread_ts), JST).strftime("%Y-%m-%d")
+        except (TypeError, ValueError, OverflowError, OSError):
+            pass
 
-        merged_data["channel_name"] = slack_channel_name
+    slack_channel_name = channel_name_future.result()
 
-        if merged_data.get("name") or merged_data.get("member_id"):
-            try:
-                write_to_spreadsheet(merged_data)
-                logger.info("スプレッドシートへの書き込みに成功しました。")
-                say(text="スプレッドシート書き込みが完了しました。", thread_ts=thread_ts)
-            except Exception as e:
-                import traceback
-                logger.error(f"スプレッドシートへの書き込みでエラーが発生: {e}")
-                traceback.print_exc()
-                logger.exception("スプレッドシートへの書き込みでエラーの詳細スタックトレース")
-                say(text=f"スプレッドシートへの書き込みでエラー: {e}", thread_ts=thread_ts)
+    # 書き込みはキューに積むだけで即座に返す (結果はワーカーがスレッドへ返信)
+    # 行はヘッダ (EXPECTED_HEADER) と同じ列順のタプルにし、書き込み時に並べ替え不要にする
+    if parsed_profile["name"] or parsed_profile["member_id"]:
+        row = (hospital_name, slack_timestamp_str, media_name) + tuple(
+            parsed_profile[k] for k in PROFILE_KEYS
+        )
+        _write_queue.put((slack_channel_name, row, say, thread_ts))
+
+# ============================
+# 処理済みリクエストの署名 (同じリクエストの再送は署名検証からスキップ)
+# ============================
+SEEN_SIGNATURES_MAX = 1024
+_seen_signatures = collections.OrderedDict()
+_seen_signatures_lock = threading.Lock()
 
 # -----------------------
-# Flaskルート設定 (現行コード同一)
+# Flaskルート設定
 # -----------------------
 @flask_app.route("/slack/events", methods=["POST"])
 def slack_events():
-    return handler.handle(request)
+    # 一度検証・処理済みの署名と同じリクエストは、何も処理せず 200 を返す
+    signature = request.headers.get("X-Slack-Signature")
+    if signature:
+        with _seen_signatures_lock:
+            if signature in _seen_signatures:
+                return "", 200
+
+    response = handler.handle(request)
+
+    # Slackからの再送 (前回の応答が3秒以内に届かなかった等)。正常に受け付けた (200) 場合は
+    # イベント自体は is_duplicate_event で捨てるので、これ以上再送しないよう X-Slack-No-Retry を返す。
+    # 失敗した応答には付けない (付けると、そのイベントが二度と届かなくなる)
+    retry_num = request.headers.get("X-Slack-Retry-Num")
+    if retry_num:
+        logger.info(
+            "Slackからの再送を受信 (retry=%s, reason=%s, status=%d)",
+            retry_num, request.headers.get("X-Slack-Retry-Reason"), response.status_code,
+        )
+        if response.status_code == 200:
+            response.headers["X-Slack-No-Retry"] = "1"
+
+    # 署名検証を通った (200 が返った) リクエストの署名だけ記録する。
+    # 未検証の署名を記録すると、正規のイベントが捨てられる恐れがあるため。
+    if signature and response.status_code == 200:
+        with _seen_signatures_lock:
+            _seen_signatures[signature] = None
+            if len(_seen_signatures) > SEEN_SIGNATURES_MAX:
+                _seen_signatures.popitem(last=False)
+    return response
 
 @flask_app.route("/", methods=["GET"])
 def healthcheck():